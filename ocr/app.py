@@ -1,13 +1,21 @@
 import os
-import base64
-from flask import Flask, request, jsonify
+import sys
+import pybase64 as base64
+import orjson
+from flask import Flask, request
 from flask_cors import CORS
 from dotenv import load_dotenv
 import requests as http
+from streaming_form_data import StreamingFormDataParser
+from streaming_form_data.parser import ParseFailedException
+from streaming_form_data.targets import ValueTarget
 
-import google_ocr
+# Containers get their environment injected; .env is for local development.
+# Loaded before google_ocr, whose Vision settings are read at import time.
+if os.getenv("FLASK_ENV") != "production":
+    load_dotenv()
 
-load_dotenv()
+import google_ocr  # noqa: E402
 
 app = Flask(__name__)
 
@@ -18,27 +26,113 @@ CORS(app, origins=_allowed_origins if _allowed_origins else "*")
 GOOGLE_CREDENTIALS_PATH = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "./credentials.json")
 ZKP_SERVICE_URL = os.getenv("ZKP_SERVICE_URL", "http://localhost:8080")
 
+MAX_IMAGE_BYTES = 20 * 1024 * 1024  # larger uploads are rejected, before or while reading
+_STREAM_CHUNK   = 64 * 1024
+_JSON_OVERHEAD  = 16 * 1024  # room for the JSON envelope around the base64 image
+
+
+class ImageTooLargeError(ValueError):
+    """Upload exceeds MAX_IMAGE_BYTES."""
+
 
 def _google_configured() -> tuple[bool, str]:
     return google_ocr.validate_credentials(GOOGLE_CREDENTIALS_PATH)
 
 
+def _json(payload, status: int = 200):
+    """JSON response serialised with orjson (much faster than jsonify on large OCR text)."""
+    return app.response_class(orjson.dumps(payload), status=status, mimetype="application/json")
+
+
+def _proxy(resp):
+    """Relay a ZKP service response unchanged — status, body and content type."""
+    return app.response_class(
+        resp.content,
+        status=resp.status_code,
+        content_type=resp.headers.get("Content-Type", "application/json"),
+    )
+
+
+def _too_large() -> ImageTooLargeError:
+    return ImageTooLargeError(
+        f"Image upload exceeds {MAX_IMAGE_BYTES // (1024 * 1024)} MB limit."
+    )
+
+
+def _json_body_limit() -> int:
+    """Largest JSON body that can carry a MAX_IMAGE_BYTES image as base64."""
+    return (MAX_IMAGE_BYTES + 2) // 3 * 4 + _JSON_OVERHEAD
+
+
+def _iter_body(req, limit: int | None = None):
+    """
+    Yield the request body in chunks, raising ImageTooLargeError as soon as it
+    passes `limit` (default MAX_IMAGE_BYTES) — this also covers chunked
+    uploads that send no Content-Length.
+    """
+    limit = MAX_IMAGE_BYTES if limit is None else limit
+    total = 0
+    while chunk := req.stream.read(_STREAM_CHUNK):
+        total += len(chunk)
+        if total > limit:
+            raise _too_large()
+        yield chunk
+
+
+def _read_multipart_image(req) -> bytes:
+    """
+    Stream the 'image' field out of a multipart body.
+
+    Werkzeug's form parser is slow on multi-megabyte files; streaming-form-data
+    parses the raw request stream in C as it arrives. Returns b"" if the body
+    has no 'image' field.
+    """
+    target = ValueTarget()
+    try:
+        parser = StreamingFormDataParser(headers=req.headers)
+        parser.register("image", target)
+        for chunk in _iter_body(req):
+            parser.data_received(chunk)
+    except ParseFailedException:
+        raise ValueError("Malformed multipart form data.")
+    return target.value
+
+
 def _get_image_bytes(req) -> bytes:
+    limit = _json_body_limit() if req.is_json else MAX_IMAGE_BYTES
+    if req.content_length is not None and req.content_length > limit:
+        raise _too_large()
+
+    if req.mimetype == "application/octet-stream":
+        # Raw image bytes as the whole body — no base64 or JSON overhead.
+        image_bytes = b"".join(_iter_body(req))
+        if image_bytes:
+            return image_bytes
+
     if req.is_json:
-        body = req.get_json(silent=True) or {}
-        if "image" not in body:
+        try:
+            body = orjson.loads(b"".join(_iter_body(req, limit)))
+        except orjson.JSONDecodeError:
+            body = None
+        if not isinstance(body, dict) or "image" not in body:
             raise ValueError("Missing 'image' field in JSON body.")
         try:
-            return base64.b64decode(body["image"])
+            image_bytes = base64.b64decode(body["image"], validate=False)
         except Exception:
             raise ValueError("Invalid base64 data in 'image' field.")
+        if len(image_bytes) > MAX_IMAGE_BYTES:
+            raise _too_large()
+        return image_bytes
 
-    if "image" in req.files:
-        return req.files["image"].read()
+    if req.mimetype == "multipart/form-data":
+        image_bytes = _read_multipart_image(req)
+        if image_bytes:
+            return image_bytes
 
     raise ValueError(
-        "No image provided. Send JSON {\"image\": \"<base64>\"} "
-        "or a multipart form with an 'image' file field."
+        "No image provided. Send JSON {\"image\": \"<base64>\"}, "
+        "a multipart form with an 'image' file field, "
+        "or raw bytes as application/octet-stream."
     )
 
 
@@ -49,7 +143,7 @@ def _get_image_bytes(req) -> bytes:
 @app.route("/health", methods=["GET"])
 def health():
     valid, message = _google_configured()
-    return jsonify({
+    return _json({
         "status": "healthy" if valid else "degraded",
         "google_configured": valid,
         "credentials_message": message,
@@ -61,58 +155,62 @@ def health():
 def ocr():
     try:
         image_bytes = _get_image_bytes(request)
+    except ImageTooLargeError as exc:
+        return _json({"success": False, "error": str(exc)}, 413)
     except ValueError as exc:
-        return jsonify({"success": False, "error": str(exc)}), 400
+        return _json({"success": False, "error": str(exc)}, 400)
 
     try:
         full_text, lines = google_ocr.extract_text_from_image(image_bytes)
-        return jsonify({"success": True, "text": full_text, "lines": lines})
+        return _json({"success": True, "text": full_text, "lines": lines})
     except google_ocr.GoogleOCRError as exc:
-        return jsonify({"success": False, "error": str(exc)}), exc.http_status
+        return _json({"success": False, "error": str(exc)}, exc.http_status)
 
 
 @app.route("/ocr/passport", methods=["POST"])
 def ocr_passport():
     try:
         image_bytes = _get_image_bytes(request)
+    except ImageTooLargeError as exc:
+        return _json({"success": False, "error": str(exc)}, 413)
     except ValueError as exc:
-        return jsonify({"success": False, "error": str(exc)}), 400
+        return _json({"success": False, "error": str(exc)}, 400)
 
     try:
         passport_data, full_text, confidence = google_ocr.analyze_passport_image(image_bytes)
-        return jsonify({"success": True, "text": full_text, "data": passport_data, "confidence": confidence})
+        return _json({"success": True, "text": full_text, "data": passport_data, "confidence": confidence})
     except google_ocr.GoogleOCRError as exc:
-        return jsonify({"success": False, "error": str(exc)}), exc.http_status
+        return _json({"success": False, "error": str(exc)}, exc.http_status)
 
 
 @app.route("/generate-proof", methods=["POST"])
 def generate_proof():
     body = request.get_json(silent=True)
     if not body:
-        return jsonify({"error": "JSON body required"}), 400
+        return _json({"error": "JSON body required"}, 400)
     try:
         resp = http.post(f"{ZKP_SERVICE_URL}/generate-proof", json=body, timeout=30)
-        return jsonify(resp.json()), resp.status_code
+        return _proxy(resp)
     except Exception as e:
-        return jsonify({"error": f"Failed to reach ZKP service: {e}"}), 502
+        return _json({"error": f"Failed to reach ZKP service: {e}"}, 502)
 
 
 @app.route("/proof-status/<job_id>", methods=["GET"])
 def proof_status(job_id):
     try:
         resp = http.get(f"{ZKP_SERVICE_URL}/proof-status/{job_id}", timeout=10)
-        return jsonify(resp.json()), resp.status_code
+        return _proxy(resp)
     except Exception as e:
-        return jsonify({"error": f"Failed to reach ZKP service: {e}"}), 502
+        return _json({"error": f"Failed to reach ZKP service: {e}"}, 502)
 
 
 @app.route("/attestation", methods=["GET"])
 def attestation():
     try:
         resp = http.get(f"{ZKP_SERVICE_URL}/attestation", timeout=10)
-        return jsonify(resp.json()), resp.status_code
+        return _proxy(resp)
     except Exception as e:
-        return jsonify({"error": f"Failed to reach ZKP service: {e}"}), 502
+        return _json({"error": f"Failed to reach ZKP service: {e}"}, 502)
 
 
 # ---------------------------------------------------------------------------
@@ -129,4 +227,16 @@ if __name__ == "__main__":
 
     port  = int(os.getenv("FLASK_PORT", 5000))
     debug = os.getenv("FLASK_DEBUG", "false").lower() == "true"
-    app.run(host="0.0.0.0", port=port, debug=debug)
+    if debug:
+        # Werkzeug dev server (single process, auto-reload) — development only.
+        app.run(host="0.0.0.0", port=port, debug=True)
+    else:
+        # Absolute paths so `python ocr/app.py` works from any directory, and
+        # this interpreter's gunicorn rather than whichever is first on PATH.
+        here = os.path.dirname(os.path.abspath(__file__))
+        os.execv(sys.executable, [
+            sys.executable, "-m", "gunicorn",
+            "--chdir", here,
+            "--config", os.path.join(here, "gunicorn.conf.py"),
+            "app:app",
+        ])
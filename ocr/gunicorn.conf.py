@@ -0,0 +1,18 @@
+"""
+Gunicorn settings for the OCR service.
+
+Each request spends almost all of its time blocked on the Google Vision
+round trip, so threaded workers (gthread) let many Vision calls be in flight
+per process instead of one.
+
+Vision limits in vision_client (VISION_RPS, VISION_MAX_CONCURRENCY) are per
+worker process, so they multiply by `workers`.
+"""
+import multiprocessing
+import os
+
+bind         = f"0.0.0.0:{os.getenv('FLASK_PORT', '5000')}"
+workers      = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads      = int(os.getenv("GUNICORN_THREADS", "16"))
+timeout      = 60  # Vision timeout (30 s) plus retry backoff
@@ -1,21 +1,25 @@
 """
-Integration tests for the OCR Flask service (app.py) and unit tests for the
-pure functions in google_ocr.py.
+Integration tests for the OCR Flask service (app.py), unit tests for the
+pure functions in google_ocr.py, and tests for the rate limiting, retry and
+batching logic in vision_client.py.
 
-Google Vision API calls are mocked so no live credentials or network access
+Google Vision API calls are faked so no live credentials or network access
 are required.  Run from the ocr/ directory with:
 
     pytest test_app.py -v
 """
-import base64
+import pybase64 as base64
+import functools
 import io
-import re
+import struct
 from datetime import date as real_date
-from unittest.mock import patch
+from types import MappingProxyType, SimpleNamespace
 
 import pytest
+from google.api_core import exceptions as gexc
 
 import google_ocr
+import vision_client
 from app import app as flask_app
 
 
@@ -23,9 +27,13 @@ from app import app as flask_app
 # Fixtures
 # ---------------------------------------------------------------------------
 
-@pytest.fixture
+flask_app.config["TESTING"] = True
+
+
+@pytest.fixture(scope="session")
 def client():
-    flask_app.config["TESTING"] = True
+    # One client for the whole run: the endpoints hold no per-request state
+    # and every external call is replaced inside each test.
     with flask_app.test_client() as c:
         yield c
 
@@ -34,11 +42,12 @@ def client():
 # Shared test data
 # ---------------------------------------------------------------------------
 
-def _minimal_png() -> bytes:
-    """1×1 white pixel PNG — smallest valid image for multipart tests."""
+@functools.lru_cache(maxsize=8)
+def _make_png(width: int, height: int) -> bytes:
+    """Uniform grey PNG of the given size, encoded once per size and reused."""
     from PIL import Image
     buf = io.BytesIO()
-    Image.new("RGB", (1, 1), (255, 255, 255)).save(buf, format="PNG")
+    Image.new("RGB", (width, height), (200, 200, 200)).save(buf, format="PNG")
     return buf.getvalue()
 
 
@@ -46,10 +55,17 @@ def _b64(image_bytes: bytes) -> str:
     return base64.b64encode(image_bytes).decode()
 
 
-_PNG = _minimal_png()
+# 1×1 white pixel PNG — smallest valid image for multipart tests.
+_PNG = (
+    b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02"
+    b"\x00\x00\x00\x90wS\xde\x00\x00\x00\x0cIDATx\x9cc\xf8\xff\xff?\x00\x05\xfe"
+    b"\x02\xfe\r\xefF\xb8\x00\x00\x00\x00IEND\xaeB`\x82"
+)
 _PNG_B64 = _b64(_PNG)
 
-_PASSPORT_DATA = {
+# Read-only so no test can leak a mutation into the next; fakes hand the app
+# dict() copies because orjson only serialises real dicts.
+_PASSPORT_DATA = MappingProxyType({
     "name": "JOHN DOE",
     "nationality": "GBR",
     "documentNumber": "123456789",
@@ -59,10 +75,22 @@ _PASSPORT_DATA = {
     "age": 40,
     "issuingCountry": "GBR",
     "personalNumber": "",
-}
+})
+
+_CONFIDENCE = MappingProxyType({"overall": 0.95, "mrz_line1": 0.95, "mrz_line2": 0.97})
+_NO_CONFIDENCE = MappingProxyType({"overall": None, "mrz_line1": None, "mrz_line2": None})
+
+
+def _raise(exc_cls, msg):
+    """Fake for an OCR entry point that always fails with exc_cls(msg)."""
+    def _fn(*a, **k):
+        raise exc_cls(msg)
+    return _fn
+
 
-_CONFIDENCE = {"overall": 0.95, "mrz_line1": 0.95, "mrz_line2": 0.97}
-_NO_CONFIDENCE = {"overall": None, "mrz_line1": None, "mrz_line2": None}
+_RAISE_QUOTA = _raise(google_ocr.QuotaError, "quota")
+_RAISE_AUTH  = _raise(google_ocr.AuthError, "bad creds")
+_RAISE_503   = _raise(google_ocr.ServiceUnavailableError, "down")
 
 
 # ---------------------------------------------------------------------------
@@ -70,18 +98,18 @@ _NO_CONFIDENCE = {"overall": None, "mrz_line1": None, "mrz_line2": None}
 # ---------------------------------------------------------------------------
 
 class TestHealth:
-    def test_healthy_when_credentials_valid(self, client):
-        with patch("google_ocr.validate_credentials", return_value=(True, "OK")):
-            r = client.get("/health")
+    def test_healthy_when_credentials_valid(self, client, monkeypatch):
+        monkeypatch.setattr("google_ocr.validate_credentials", lambda *a, **k: (True, "OK"))
+        r = client.get("/health")
         assert r.status_code == 200
         body = r.get_json()
         assert body["status"] == "healthy"
         assert body["google_configured"] is True
         assert "credentials_message" in body
 
-    def test_degraded_when_credentials_missing(self, client):
-        with patch("google_ocr.validate_credentials", return_value=(False, "File not found")):
-            r = client.get("/health")
+    def test_degraded_when_credentials_missing(self, client, monkeypatch):
+        monkeypatch.setattr("google_ocr.validate_credentials", lambda *a, **k: (False, "File not found"))
+        r = client.get("/health")
         assert r.status_code == 200
         body = r.get_json()
         assert body["status"] == "degraded"
@@ -94,25 +122,92 @@ class TestHealth:
 # ---------------------------------------------------------------------------
 
 class TestOCR:
-    def test_json_base64_returns_text_and_lines(self, client):
-        with patch("google_ocr.extract_text_from_image", return_value=("hello world", ["hello world"])):
-            r = client.post("/ocr", json={"image": _PNG_B64})
+    def test_json_base64_returns_text_and_lines(self, client, monkeypatch):
+        monkeypatch.setattr("google_ocr.extract_text_from_image", lambda *a, **k: ("hello world", ["hello world"]))
+        r = client.post("/ocr", json={"image": _PNG_B64})
         assert r.status_code == 200
         body = r.get_json()
         assert body["success"] is True
         assert body["text"] == "hello world"
         assert body["lines"] == ["hello world"]
 
-    def test_multipart_upload_accepted(self, client):
-        with patch("google_ocr.extract_text_from_image", return_value=("hello", ["hello"])):
-            r = client.post(
-                "/ocr",
-                data={"image": (io.BytesIO(_PNG), "passport.png")},
-                content_type="multipart/form-data",
-            )
+    def test_multipart_upload_accepted(self, client, monkeypatch):
+        monkeypatch.setattr("google_ocr.extract_text_from_image", lambda *a, **k: ("hello", ["hello"]))
+        r = client.post(
+            "/ocr",
+            data={"image": (io.BytesIO(_PNG), "passport.png")},
+            content_type="multipart/form-data",
+        )
         assert r.status_code == 200
         assert r.get_json()["success"] is True
 
+    def test_multipart_upload_passes_file_bytes_through(self, client, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            "google_ocr.extract_text_from_image",
+            lambda image_bytes: calls.append(image_bytes) or ("hello", ["hello"]),
+        )
+        client.post(
+            "/ocr",
+            data={"note": "x", "image": (io.BytesIO(_PNG), "passport.png")},
+            content_type="multipart/form-data",
+        )
+        assert calls == [_PNG]
+
+    def test_multipart_without_image_field_returns_400(self, client):
+        r = client.post("/ocr", data={"note": "x"}, content_type="multipart/form-data")
+        assert r.status_code == 400
+        assert r.get_json()["success"] is False
+
+    def test_oversized_upload_returns_413(self, client, monkeypatch):
+        monkeypatch.setattr("app.MAX_IMAGE_BYTES", 1024)
+        r = client.post(
+            "/ocr",
+            data={"image": (io.BytesIO(b"x" * 2048), "passport.png")},
+            content_type="multipart/form-data",
+        )
+        assert r.status_code == 413
+        assert r.get_json()["success"] is False
+
+    def test_oversized_upload_without_content_length_returns_413(self, client, monkeypatch):
+        # Chunked transfer: no Content-Length, so the limit is enforced while streaming.
+        monkeypatch.setattr("app.MAX_IMAGE_BYTES", 1024)
+        r = client.post(
+            "/ocr",
+            input_stream=io.BytesIO(b"x" * 2048),
+            content_type="application/octet-stream",
+            environ_overrides={"CONTENT_LENGTH": "", "wsgi.input_terminated": True},
+        )
+        assert r.status_code == 413
+
+    @pytest.mark.parametrize("image_size", [
+        pytest.param(4096, id="caught_after_decoding"),
+        pytest.param(64 * 1024, id="caught_while_streaming"),
+    ])
+    def test_oversized_json_upload_without_content_length_returns_413(self, client, monkeypatch, image_size):
+        calls = []
+        monkeypatch.setattr("app.MAX_IMAGE_BYTES", 1024)
+        monkeypatch.setattr("google_ocr.extract_text_from_image", lambda image_bytes: calls.append(image_bytes))
+        body = b'{"image": "%s"}' % _b64(b"x" * image_size).encode()
+        r = client.post(
+            "/ocr",
+            input_stream=io.BytesIO(body),
+            content_type="application/json",
+            environ_overrides={"CONTENT_LENGTH": "", "wsgi.input_terminated": True},
+        )
+        assert r.status_code == 413
+        assert calls == []
+
+    def test_raw_octet_stream_body_accepted(self, client, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            "google_ocr.extract_text_from_image",
+            lambda image_bytes: calls.append(image_bytes) or ("hello", ["hello"]),
+        )
+        r = client.post("/ocr", data=_PNG, content_type="application/octet-stream")
+        assert r.status_code == 200
+        assert calls == [_PNG]
+
     def test_missing_image_field_returns_400(self, client):
         r = client.post("/ocr", json={})
         assert r.status_code == 400
@@ -125,9 +220,9 @@ class TestOCR:
         assert r.status_code == 400
         assert r.get_json()["success"] is False
 
-    def test_quota_error_returns_429(self, client):
-        with patch("google_ocr.extract_text_from_image", side_effect=google_ocr.QuotaError("quota")):
-            r = client.post("/ocr", json={"image": _PNG_B64})
+    def test_quota_error_returns_429(self, client, monkeypatch):
+        monkeypatch.setattr("google_ocr.extract_text_from_image", _RAISE_QUOTA)
+        r = client.post("/ocr", json={"image": _PNG_B64})
         assert r.status_code == 429
         assert r.get_json()["success"] is False
 
@@ -137,9 +232,9 @@ class TestOCR:
 # ---------------------------------------------------------------------------
 
 class TestOCRPassport:
-    def test_valid_passport_returns_structured_data(self, client):
-        with patch("google_ocr.analyze_passport_image", return_value=(_PASSPORT_DATA, "raw text", _CONFIDENCE)):
-            r = client.post("/ocr/passport", json={"image": _PNG_B64})
+    def test_valid_passport_returns_structured_data(self, client, monkeypatch):
+        monkeypatch.setattr("google_ocr.analyze_passport_image", lambda *a, **k: (dict(_PASSPORT_DATA), "raw text", dict(_CONFIDENCE)))
+        r = client.post("/ocr/passport", json={"image": _PNG_B64})
         assert r.status_code == 200
         body = r.get_json()
         assert body["success"] is True
@@ -149,16 +244,16 @@ class TestOCRPassport:
         assert data["sex"] == "M"
         assert isinstance(data["age"], int)
 
-    def test_date_fields_are_yymmdd(self, client):
-        with patch("google_ocr.analyze_passport_image", return_value=(_PASSPORT_DATA, "raw", _CONFIDENCE)):
-            r = client.post("/ocr/passport", json={"image": _PNG_B64})
+    def test_date_fields_are_yymmdd(self, client, monkeypatch):
+        monkeypatch.setattr("google_ocr.analyze_passport_image", lambda *a, **k: (dict(_PASSPORT_DATA), "raw", dict(_CONFIDENCE)))
+        r = client.post("/ocr/passport", json={"image": _PNG_B64})
         data = r.get_json()["data"]
-        assert re.match(r"^\d{6}$", data["dateOfBirth"])
-        assert re.match(r"^\d{6}$", data["dateOfExpiry"])
+        assert len(data["dateOfBirth"]) == 6 and data["dateOfBirth"].isdigit()
+        assert len(data["dateOfExpiry"]) == 6 and data["dateOfExpiry"].isdigit()
 
-    def test_no_mrz_returns_success_with_null_data(self, client):
-        with patch("google_ocr.analyze_passport_image", return_value=(None, "some text", _NO_CONFIDENCE)):
-            r = client.post("/ocr/passport", json={"image": _PNG_B64})
+    def test_no_mrz_returns_success_with_null_data(self, client, monkeypatch):
+        monkeypatch.setattr("google_ocr.analyze_passport_image", lambda *a, **k: (None, "some text", dict(_NO_CONFIDENCE)))
+        r = client.post("/ocr/passport", json={"image": _PNG_B64})
         assert r.status_code == 200
         body = r.get_json()
         assert body["success"] is True
@@ -169,42 +264,71 @@ class TestOCRPassport:
         assert r.status_code == 400
         assert r.get_json()["success"] is False
 
-    def test_auth_error_returns_403(self, client):
-        with patch("google_ocr.analyze_passport_image", side_effect=google_ocr.AuthError("bad creds")):
-            r = client.post("/ocr/passport", json={"image": _PNG_B64})
+    def test_auth_error_returns_403(self, client, monkeypatch):
+        monkeypatch.setattr("google_ocr.analyze_passport_image", _RAISE_AUTH)
+        r = client.post("/ocr/passport", json={"image": _PNG_B64})
         assert r.status_code == 403
         assert r.get_json()["success"] is False
 
-    def test_service_unavailable_returns_503(self, client):
-        with patch("google_ocr.analyze_passport_image", side_effect=google_ocr.ServiceUnavailableError("down")):
-            r = client.post("/ocr/passport", json={"image": _PNG_B64})
+    def test_service_unavailable_returns_503(self, client, monkeypatch):
+        monkeypatch.setattr("google_ocr.analyze_passport_image", _RAISE_503)
+        r = client.post("/ocr/passport", json={"image": _PNG_B64})
         assert r.status_code == 503
         assert r.get_json()["success"] is False
 
-    def test_confidence_has_all_keys(self, client):
-        with patch("google_ocr.analyze_passport_image", return_value=(_PASSPORT_DATA, "raw", _CONFIDENCE)):
-            r = client.post("/ocr/passport", json={"image": _PNG_B64})
+    def test_confidence_has_all_keys(self, client, monkeypatch):
+        monkeypatch.setattr("google_ocr.analyze_passport_image", lambda *a, **k: (dict(_PASSPORT_DATA), "raw", dict(_CONFIDENCE)))
+        r = client.post("/ocr/passport", json={"image": _PNG_B64})
         conf = r.get_json()["confidence"]
         assert set(conf.keys()) == {"overall", "mrz_line1", "mrz_line2"}
 
-    def test_confidence_overall_is_min_of_lines(self, client):
+    def test_confidence_overall_is_min_of_lines(self, client, monkeypatch):
         conf = {"overall": 0.91, "mrz_line1": 0.91, "mrz_line2": 0.97}
-        with patch("google_ocr.analyze_passport_image", return_value=(_PASSPORT_DATA, "raw", conf)):
-            r = client.post("/ocr/passport", json={"image": _PNG_B64})
+        monkeypatch.setattr("google_ocr.analyze_passport_image", lambda *a, **k: (dict(_PASSPORT_DATA), "raw", conf))
+        r = client.post("/ocr/passport", json={"image": _PNG_B64})
         c = r.get_json()["confidence"]
         assert c["overall"] == min(c["mrz_line1"], c["mrz_line2"])
 
-    def test_multipart_passport_accepted(self, client):
-        with patch("google_ocr.analyze_passport_image", return_value=(_PASSPORT_DATA, "raw", _CONFIDENCE)):
-            r = client.post(
-                "/ocr/passport",
-                data={"image": (io.BytesIO(_PNG), "passport.png")},
-                content_type="multipart/form-data",
-            )
+    def test_multipart_passport_accepted(self, client, monkeypatch):
+        monkeypatch.setattr("google_ocr.analyze_passport_image", lambda *a, **k: (dict(_PASSPORT_DATA), "raw", dict(_CONFIDENCE)))
+        r = client.post(
+            "/ocr/passport",
+            data={"image": (io.BytesIO(_PNG), "passport.png")},
+            content_type="multipart/form-data",
+        )
         assert r.status_code == 200
         assert r.get_json()["success"] is True
 
 
+# ---------------------------------------------------------------------------
+# ZKP service proxy routes
+# ---------------------------------------------------------------------------
+
+def _upstream(body: bytes, status: int = 200):
+    return SimpleNamespace(content=body, status_code=status, headers={"Content-Type": "application/json"})
+
+
+class TestZkpProxy:
+    def test_upstream_body_is_relayed_byte_for_byte(self, client, monkeypatch):
+        body = b'{"commitment": 123456789012345678901234567890, "1": true}'  # > 64-bit int
+        monkeypatch.setattr("app.http.get", lambda *a, **k: _upstream(body))
+        r = client.get("/attestation")
+        assert r.status_code == 200
+        assert r.data == body
+        assert r.mimetype == "application/json"
+
+    def test_upstream_status_is_preserved(self, client, monkeypatch):
+        monkeypatch.setattr("app.http.post", lambda *a, **k: _upstream(b'{"error": "bad input"}', 422))
+        r = client.post("/generate-proof", json={"x": 1})
+        assert r.status_code == 422
+        assert r.get_json() == {"error": "bad input"}
+
+    def test_unreachable_service_returns_502(self, client, monkeypatch):
+        monkeypatch.setattr("app.http.get", _raise(ConnectionError, "refused"))
+        r = client.get("/proof-status/job-1")
+        assert r.status_code == 502
+
+
 # ---------------------------------------------------------------------------
 # google_ocr unit tests  (pure functions — no Vision API calls)
 # ---------------------------------------------------------------------------
@@ -218,57 +342,52 @@ _IRISH_MRZ_TEXT = f"{_IRISH_LINE1}\n{_IRISH_LINE2}\n"
 _FROZEN_TODAY = real_date(2026, 2, 24)
 
 
-@pytest.fixture
+class _FrozenDate(real_date):
+    @classmethod
+    def today(cls):
+        return _FROZEN_TODAY
+
+
+@pytest.fixture(scope="class")
 def frozen_date():
     """Freeze date.today() to 2026-02-24 for deterministic age calculations."""
-    with patch("google_ocr.date") as mock_date:
-        mock_date.today.return_value = _FROZEN_TODAY
-        mock_date.side_effect = real_date  # keep date(y, m, d) construction working
-        yield mock_date
+    original = google_ocr.date
+    google_ocr.date = _FrozenDate  # date(y, m, d) construction keeps working
+    yield
+    google_ocr.date = original
 
 
 class TestCheckDigit:
-    def test_all_filler_is_zero(self):
-        assert google_ocr._check_digit("<<<<<<") == 0
-
-    def test_empty_string_is_zero(self):
-        assert google_ocr._check_digit("") == 0
-
-    def test_digits_dob(self):
-        # DOB "880504" → check digit 9  (Irish passport, verified live)
-        assert google_ocr._check_digit("880504") == 9
-
-    def test_alphanumeric_doc_number(self):
-        # Doc number "XN5003778" → check digit 6  (Irish passport, verified live)
-        assert google_ocr._check_digit("XN5003778") == 6
-
-    def test_digits_expiry(self):
-        # Expiry "230915" → check digit 4  (Irish passport, verified live)
-        assert google_ocr._check_digit("230915") == 4
+    @pytest.mark.parametrize("data, expected", [
+        pytest.param("<<<<<<", 0, id="all_filler"),
+        pytest.param("", 0, id="empty"),
+        # Irish passport fields, verified live
+        pytest.param("880504", 9, id="dob"),
+        pytest.param("XN5003778", 6, id="alphanumeric_doc_number"),
+        pytest.param("230915", 4, id="expiry"),
+    ])
+    def test_check_digit(self, data, expected):
+        assert google_ocr._check_digit(data) == expected
 
 
 class TestCleanMrzLine:
-    def test_strips_leading_trailing_whitespace(self):
-        assert google_ocr._clean_mrz_line("  P<MYS  ") == "P<MYS"
-
-    def test_removes_internal_spaces(self):
-        assert google_ocr._clean_mrz_line("P<MYS MAHATHIR") == "P<MYSMAHATHIR"
-
-    def test_uppercases(self):
-        assert google_ocr._clean_mrz_line("p<mys") == "P<MYS"
-
-    def test_replaces_guillemets(self):
-        assert google_ocr._clean_mrz_line("A«B»C") == "A<B<C"
-
-    def test_replaces_unicode_guillemets(self):
-        assert google_ocr._clean_mrz_line("A\u00ABB\u00BBC") == "A<B<C"
+    @pytest.mark.parametrize("line, expected", [
+        pytest.param("  P<MYS  ", "P<MYS", id="strips_outer_whitespace"),
+        pytest.param("P<MYS MAHATHIR", "P<MYSMAHATHIR", id="removes_internal_spaces"),
+        pytest.param("p<mys", "P<MYS", id="uppercases"),
+        pytest.param("A«B»C", "A<B<C", id="guillemets"),
+        pytest.param("A\u00ABB\u00BBC", "A<B<C", id="unicode_guillemets"),
+        pytest.param("straße", "STRAßE", id="non_ascii_not_expanded"),
+    ])
+    def test_clean_mrz_line(self, line, expected):
+        assert google_ocr._clean_mrz_line(line) == expected
 
 
 class TestFindMrzLines:
     def test_valid_mrz_returns_line_pair(self):
         result = google_ocr._find_mrz_lines(_IRISH_MRZ_TEXT)
         assert result is not None
-        assert result == (_IRISH_LINE1, _IRISH_LINE2)
+        assert result == ((_IRISH_LINE1, _IRISH_LINE2), (_IRISH_LINE1, _IRISH_LINE2))
 
     def test_no_mrz_returns_none(self):
         assert google_ocr._find_mrz_lines("No MRZ here at all") is None
@@ -281,6 +400,22 @@ class TestFindMrzLines:
         line_b = "X" + "0" * 43
         assert google_ocr._find_mrz_lines(f"{line_a}\n{line_b}\n") is None
 
+    def test_finds_mrz_below_page_text(self):
+        header = "\n".join(["PASSPORT", "IRELAND", "P<" + "X" * 42, "Surname / Sloinne", "OSULLIVAN"])
+        assert google_ocr._find_mrz_lines(f"{header}\n{_IRISH_MRZ_TEXT}")[0] == (_IRISH_LINE1, _IRISH_LINE2)
+
+    def test_accepts_misread_P_when_check_digit_verifies(self):
+        misread_line1 = "F" + _IRISH_LINE1[1:]
+        result = google_ocr._find_mrz_lines(f"{misread_line1}\n{_IRISH_LINE2}\n")
+        assert result[0] == (misread_line1, _IRISH_LINE2)
+
+    def test_prefers_pair_whose_check_digit_verifies(self):
+        # A 'P' decoy above a misread line 1 would win on the 'P' heuristic alone
+        decoy = "P<" + "X" * 42
+        misread_line1 = "F" + _IRISH_LINE1[1:]
+        text = f"{decoy}\n{misread_line1}\n{_IRISH_LINE2}\n"
+        assert google_ocr._find_mrz_lines(text)[0] == (misread_line1, _IRISH_LINE2)
+
     def test_handles_internal_space_in_line(self):
         # Vision sometimes inserts a space mid-line; _clean_mrz_line removes it
         spaced_line2 = _IRISH_LINE2[:20] + " " + _IRISH_LINE2[20:]
@@ -288,6 +423,44 @@ class TestFindMrzLines:
         assert result is not None
 
 
+class TestFixMrzPositions:
+    def test_valid_mrz_is_unchanged(self):
+        assert google_ocr._fix_mrz_positions(_IRISH_LINE1, _IRISH_LINE2) == (_IRISH_LINE1, _IRISH_LINE2)
+
+    def test_letters_in_date_fields_become_digits(self):
+        misread = _IRISH_LINE2[:13] + "88O5O49" + _IRISH_LINE2[20:21] + "23O9IS4" + _IRISH_LINE2[28:43] + "B"
+        _, line2 = google_ocr._fix_mrz_positions(_IRISH_LINE1, misread)
+        assert line2 == _IRISH_LINE2
+        assert google_ocr._check_digit(line2[13:19]) == int(line2[19])
+
+    def test_digits_in_country_and_names_become_letters(self):
+        misread = "P<1RL0SULL1VAN<<LAUREN<<<<<<<<<<<<<<<<<<<<<<"
+        line1, _ = google_ocr._fix_mrz_positions(misread, _IRISH_LINE2)
+        assert line1 == _IRISH_LINE1
+
+    def test_document_number_is_left_alone(self):
+        # Document numbers are alphanumeric — 'O' vs '0' cannot be decided there
+        line2 = "XNS0O3778" + _IRISH_LINE2[9:]
+        assert google_ocr._fix_mrz_positions(_IRISH_LINE1, line2)[1][:9] == "XNS0O3778"
+
+    def test_find_mrz_lines_applies_fixes(self):
+        misread = _IRISH_LINE2[:13] + "88O5O49" + _IRISH_LINE2[20:]
+        fixed, cleaned = google_ocr._find_mrz_lines(f"{_IRISH_LINE1}\n{misread}\n")
+        assert fixed == (_IRISH_LINE1, _IRISH_LINE2)
+        assert cleaned == (_IRISH_LINE1, misread)  # as read, for confidence lookup
+
+
+class TestCompositeCheck:
+    def test_valid_line2(self):
+        assert google_ocr._composite_check_ok(_IRISH_LINE2)
+
+    def test_corrupted_line2(self):
+        assert not google_ocr._composite_check_ok(_IRISH_LINE2[:43] + "1")
+
+    def test_non_digit_composite(self):
+        assert not google_ocr._composite_check_ok(_IRISH_LINE2[:43] + "<")
+
+
 class TestCalculateAge:
     def test_birthday_already_passed_this_year(self, frozen_date):
         # Born Jan 1 1985 — birthday already passed (today is Feb 24 2026)
@@ -309,26 +482,15 @@ class TestCalculateAge:
 
 
 class TestParseNames:
-    def test_surname_and_given_names(self):
-        s, g = google_ocr._parse_names("OSULLIVAN<<LAUREN<<<<<<<<<<<<<<<<<<<<<<<")
-        assert s == "OSULLIVAN"
-        assert g == "LAUREN"
-
-    def test_single_component_malay_name(self):
+    @pytest.mark.parametrize("field, surname, given", [
+        pytest.param("OSULLIVAN<<LAUREN<<<<<<<<<<<<<<<<<<<<<<<", "OSULLIVAN", "LAUREN", id="surname_and_given"),
         # No << separator → entire field is surname, no given names
-        s, g = google_ocr._parse_names("MAHATHIR<BIN<IDRUS<<<<<<<<<<<<<<<<<<<<")
-        assert s == "MAHATHIR BIN IDRUS"
-        assert g == ""
-
-    def test_multi_word_given_names(self):
-        s, g = google_ocr._parse_names("SMITH<<JOHN<WILLIAM<<<<<<<<<<<<<<<<<<<<")
-        assert s == "SMITH"
-        assert g == "JOHN WILLIAM"
-
-    def test_all_filler_given_names_is_empty(self):
-        s, g = google_ocr._parse_names("DOE<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<")
-        assert s == "DOE"
-        assert g == ""
+        pytest.param("MAHATHIR<BIN<IDRUS<<<<<<<<<<<<<<<<<<<<", "MAHATHIR BIN IDRUS", "", id="single_component_malay"),
+        pytest.param("SMITH<<JOHN<WILLIAM<<<<<<<<<<<<<<<<<<<<", "SMITH", "JOHN WILLIAM", id="multi_word_given"),
+        pytest.param("DOE<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<", "DOE", "", id="all_filler_given"),
+    ])
+    def test_parse_names(self, field, surname, given):
+        assert google_ocr._parse_names(field) == (surname, given)
 
 
 class TestParseMrz:
@@ -396,27 +558,569 @@ class TestValidateCredentials:
         assert msg == "OK"
 
 
+def _jpeg_size(data: bytes) -> tuple[int, int]:
+    """(width, height) from a JPEG's SOF header, without decoding any pixels."""
+    i = 2  # skip SOI
+    while i + 9 < len(data):
+        marker, length = data[i + 1], struct.unpack(">H", data[i + 2:i + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    raise ValueError("no SOF marker found")
+
+
 class TestPreprocessForMrz:
-    def _make_png(self, width: int, height: int) -> bytes:
-        from PIL import Image
-        buf = io.BytesIO()
-        Image.new("RGB", (width, height), (200, 200, 200)).save(buf, format="PNG")
-        return buf.getvalue()
+    _make_png = staticmethod(_make_png)
 
     def test_returns_non_empty_bytes(self):
         result = google_ocr._preprocess_for_mrz(self._make_png(100, 200))
         assert isinstance(result, bytes) and len(result) > 0
 
-    def test_output_is_valid_png(self):
-        from PIL import Image
+    def test_output_is_valid_jpeg(self):
         result = google_ocr._preprocess_for_mrz(self._make_png(100, 200))
-        img = Image.open(io.BytesIO(result))
-        assert img.format == "PNG"
+        assert result[:3] == b"\xff\xd8\xff"
 
-    def test_output_dimensions_match_crop_and_upscale(self):
+    def test_heic_input_is_decoded(self):
+        import pillow_heif
         from PIL import Image
+        buf = io.BytesIO()
+        pillow_heif.from_pillow(Image.new("RGB", (100, 200), (200, 200, 200))).save(buf)
+        heic = buf.getvalue()
+        assert google_ocr._is_heif(heic)
+        assert google_ocr._preprocess_for_mrz(heic)
+
+    def test_output_dimensions_match_crop_and_upscale(self):
         # 100×200 input → bottom 20% = 40px tall, upscaled 2× → 80px tall, 200px wide
         result = google_ocr._preprocess_for_mrz(self._make_png(100, 200))
-        img = Image.open(io.BytesIO(result))
-        assert img.height == 80
-        assert img.width == 200
+        assert _jpeg_size(result) == (200, 80)
+
+
+def _vision_response(text: str):
+    from google.cloud import vision
+    return vision.AnnotateImageResponse(full_text_annotation=vision.TextAnnotation(text=text))
+
+
+def _fake_vision(monkeypatch, name: str, *responses) -> list:
+    """Replace google_ocr.<name> with a fake returning responses in turn; returns its recorded calls."""
+    calls = []
+    replies = iter(responses)
+    monkeypatch.setattr(google_ocr, name, lambda *args: calls.append(args) or next(replies))
+    return calls
+
+
+@pytest.fixture
+def empty_ocr_cache():
+    google_ocr._OCR_CACHE.clear()
+    yield
+    google_ocr._OCR_CACHE.clear()
+
+
+class TestFitForVision:
+    def test_small_image_is_sent_unchanged(self):
+        png = _make_png(100, 200)
+        img = google_ocr._decode_greyscale(png)
+        assert google_ocr._fit_for_vision(img, png, 2400) is png
+
+    def test_oversized_image_is_downscaled_to_max_dim(self):
+        import numpy as np
+        img = np.full((1500, 4000), 200, dtype=np.uint8)
+        result = google_ocr._fit_for_vision(img, b"original", 2400)
+        decoded = google_ocr._decode_greyscale(result)
+        assert result[:3] == b"\xff\xd8\xff"  # JPEG
+        assert decoded.shape == (900, 2400)
+
+
+class TestExtractTextFromImage:
+    def test_oversized_upload_is_downscaled_in_colour(self, empty_ocr_cache, monkeypatch):
+        from PIL import Image
+        buf = io.BytesIO()
+        Image.new("RGB", (400, 200), (200, 30, 30)).save(buf, format="PNG")
+        monkeypatch.setattr(google_ocr, "_TEXT_MAX_DIM", 100)
+        calls = _fake_vision(monkeypatch, "_call_vision_api", _vision_response("text"))
+        google_ocr.extract_text_from_image(buf.getvalue())
+        (upload,), = calls
+        sent = Image.open(io.BytesIO(upload))
+        assert sent.mode == "RGB" and sent.size == (100, 50)
+        r, g, b = sent.getpixel((50, 25))
+        assert r > 150 and g < 80 and b < 80  # still red, not grey
+
+
+class TestIsHeif:
+    def test_heic_and_avif_brands(self):
+        assert google_ocr._is_heif(b"\x00\x00\x00\x18ftypheic\x00\x00\x00\x00")
+        assert google_ocr._is_heif(b"\x00\x00\x00\x1cftypavif\x00\x00\x00\x00")
+
+    def test_jpeg_and_png_are_not_heif(self):
+        assert not google_ocr._is_heif(b"\xff\xd8\xff\xe0\x00\x10JFIF\x00")
+        assert not google_ocr._is_heif(_PNG)
+
+
+class TestOcrCache:
+    def test_repeat_text_request_skips_vision(self, empty_ocr_cache, monkeypatch):
+        calls = _fake_vision(monkeypatch, "_call_vision_api", _vision_response("hello\nworld"))
+        first = google_ocr.extract_text_from_image(b"image-a")
+        second = google_ocr.extract_text_from_image(b"image-a")
+        assert first == second == ("hello\nworld", ["hello", "world"])
+        assert len(calls) == 1
+
+    def test_mutating_a_result_does_not_change_later_hits(self, empty_ocr_cache, monkeypatch):
+        png = _make_png(100, 200)
+        _fake_vision(
+            monkeypatch, "_call_vision_api_batch", [_vision_response(_IRISH_MRZ_TEXT), _vision_response("full")],
+        )
+        data, _, confidence = google_ocr.analyze_passport_image(png)
+        data["documentNumber"] = "tampered"
+        confidence["overall"] = 0.0
+        again, _, again_conf = google_ocr.analyze_passport_image(png)
+        assert again["documentNumber"] == "XN5003778"
+        assert again_conf["overall"] != 0.0
+
+    def test_different_bytes_are_not_shared(self, empty_ocr_cache, monkeypatch):
+        calls = _fake_vision(monkeypatch, "_call_vision_api", _vision_response("x"), _vision_response("x"))
+        google_ocr.extract_text_from_image(b"image-a")
+        google_ocr.extract_text_from_image(b"image-b")
+        assert len(calls) == 2
+
+    def test_repeat_passport_request_skips_vision(self, empty_ocr_cache, monkeypatch):
+        png = _make_png(100, 200)
+        calls = _fake_vision(
+            monkeypatch, "_call_vision_api_batch", [_vision_response(_IRISH_MRZ_TEXT), _vision_response("full")],
+        )
+        first = google_ocr.analyze_passport_image(png)
+        second = google_ocr.analyze_passport_image(png)
+        assert first == second
+        assert first[0]["documentNumber"] == "XN5003778"
+        assert len(calls) == 1
+
+    def test_pass1_miss_is_remembered_when_pass2_fails(self, empty_ocr_cache, monkeypatch):
+        from google.cloud import vision
+        png = _make_png(100, 200)
+        failed = vision.AnnotateImageResponse(error={"code": 13, "message": "internal"})
+        _fake_vision(monkeypatch, "_call_vision_api_batch", [_vision_response("no mrz"), failed])
+        calls = _fake_vision(monkeypatch, "_call_vision_api", _vision_response(_IRISH_MRZ_TEXT))
+        with pytest.raises(google_ocr.GoogleOCRError):
+            google_ocr.analyze_passport_image(png)
+        data, _, _ = google_ocr.analyze_passport_image(png)
+        assert data is not None
+        assert len(calls) == 1  # retry sends only the full image
+
+    def test_pass1_error_is_not_remembered_as_a_miss(self, empty_ocr_cache, monkeypatch):
+        from google.cloud import vision
+        png = _make_png(100, 200)
+        failed = vision.AnnotateImageResponse(error={"code": 14, "message": "unavailable"})
+        batch_calls = _fake_vision(
+            monkeypatch, "_call_vision_api_batch",
+            [failed, failed], [_vision_response(_IRISH_MRZ_TEXT), _vision_response("full")],
+        )
+        calls = _fake_vision(monkeypatch, "_call_vision_api")
+        with pytest.raises(google_ocr.GoogleOCRError):
+            google_ocr.analyze_passport_image(png)
+        data, _, _ = google_ocr.analyze_passport_image(png)
+        assert data["documentNumber"] == "XN5003778"
+        assert len(batch_calls) == 2  # retry tries the MRZ crop again
+        assert calls == []
+
+
+class TestAnalyzePassportImage:
+    def test_single_batch_rpc_for_both_passes(self, empty_ocr_cache, monkeypatch):
+        png = _make_png(100, 200)
+        calls = _fake_vision(
+            monkeypatch, "_call_vision_api_batch", [_vision_response("no mrz"), _vision_response(_IRISH_MRZ_TEXT)],
+        )
+        data, text, _ = google_ocr.analyze_passport_image(png)
+        assert len(calls) == 1
+        images, _contexts = calls[0]
+        assert images[1] == png
+        assert data["documentNumber"] == "XN5003778"
+        assert text == _IRISH_MRZ_TEXT
+
+    def test_undecodable_image_sends_full_image_only(self, empty_ocr_cache, monkeypatch):
+        calls = _fake_vision(monkeypatch, "_call_vision_api", _vision_response("text"))
+        batch_calls = _fake_vision(monkeypatch, "_call_vision_api_batch")
+        data, text, _ = google_ocr.analyze_passport_image(b"not an image")
+        assert data is None and text == "text"
+        assert len(calls) == 1
+        assert batch_calls == []
+
+
+class TestExtractMrzConfidence:
+    def _response(self, lines_with_conf: list[tuple[str, float]]):
+        from google.cloud import vision
+        words = [
+            {"symbols": [{"text": ch, "confidence": conf} for ch in line]}
+            for line, conf in lines_with_conf
+        ]
+        text = "".join(f"{line}\n" for line, _ in lines_with_conf)
+        return vision.AnnotateImageResponse(full_text_annotation={
+            "text": text,
+            "pages": [{"blocks": [{"paragraphs": [{"words": words}]}]}],
+        })
+
+    def test_per_line_and_overall_confidence(self):
+        response = self._response([("PASSPORT", 0.5), (_IRISH_LINE1, 0.75), (_IRISH_LINE2, 0.875)])
+        conf = google_ocr._extract_mrz_confidence(response, (_IRISH_LINE1, _IRISH_LINE2))
+        assert conf == {"overall": 0.75, "mrz_line1": 0.75, "mrz_line2": 0.875}
+
+    def test_no_pages_returns_none_values(self):
+        conf = google_ocr._extract_mrz_confidence(_vision_response(_IRISH_MRZ_TEXT), (_IRISH_LINE1, _IRISH_LINE2))
+        assert conf == {"overall": None, "mrz_line1": None, "mrz_line2": None}
+
+    def test_no_mrz_returns_none_values(self):
+        response = self._response([("PASSPORT", 0.5)])
+        assert google_ocr._extract_mrz_confidence(response, None) == {
+            "overall": None, "mrz_line1": None, "mrz_line2": None,
+        }
+
+    def test_scores_the_pair_that_was_parsed(self):
+        # The decoy is the first 44-char line from the top, but the pair below
+        # it is the one whose check digit verifies — score that pair, not the decoy
+        decoy = "P<" + "X" * 42
+        misread_line1 = "F" + _IRISH_LINE1[1:]
+        response = self._response([(decoy, 0.1), (misread_line1, 0.9), (_IRISH_LINE2, 0.95)])
+        passport_data, _, conf = google_ocr._read_passport(response)
+        assert passport_data["documentNumber"] == "XN5003778"
+        assert conf == {"overall": 0.9, "mrz_line1": 0.9, "mrz_line2": 0.95}
+
+
+# ---------------------------------------------------------------------------
+# vision_client unit tests  (the Vision RPC itself is always faked)
+# ---------------------------------------------------------------------------
+
+class _FakeClock:
+    """Stands in for the time module: sleep() advances monotonic() instantly."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    clock = _FakeClock()
+    monkeypatch.setattr(vision_client, "time", SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep))
+    return clock
+
+
+@pytest.fixture
+def vision_state(fake_clock, monkeypatch):
+    """A roomy rate limiter and a closed circuit breaker on the fake clock, restored afterwards."""
+    monkeypatch.setattr(vision_client, "_rate_limiter", vision_client.RateLimiter(1000))
+    monkeypatch.setattr(vision_client, "_consecutive_outages", 0)
+    monkeypatch.setattr(vision_client, "_breaker_open_until", 0.0)
+
+
+class TestGetClient:
+    @pytest.fixture(autouse=True)
+    def _fresh_client(self):
+        vision_client.reset_vision_client()
+        yield
+        vision_client.reset_vision_client()  # never leak a fake client to other tests
+
+    def test_client_is_built_once_and_reused(self, monkeypatch):
+        built = []
+        monkeypatch.setattr(vision_client.vision, "ImageAnnotatorClient", lambda: built.append(object()) or built[-1])
+        assert vision_client._get_client() is vision_client._get_client()
+        assert len(built) == 1
+
+    def test_construction_failure_is_not_cached(self, monkeypatch):
+        from google.auth.exceptions import DefaultCredentialsError
+        attempts = iter([DefaultCredentialsError("no credentials"), "client"])
+
+        def _build():
+            outcome = next(attempts)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        monkeypatch.setattr(vision_client.vision, "ImageAnnotatorClient", _build)
+        with pytest.raises(DefaultCredentialsError):
+            vision_client._get_client()
+        assert vision_client._get_client() == "client"
+
+
+class TestRateLimiter:
+    @pytest.mark.parametrize("rate", [0, -1])
+    def test_non_positive_rate_is_rejected(self, rate):
+        with pytest.raises(ValueError):
+            vision_client.RateLimiter(rate)
+
+    def test_rate_below_one_still_grants_a_token(self, fake_clock):
+        limiter = vision_client.RateLimiter(0.5)
+        assert limiter.acquire(0) is True
+        assert limiter.acquire(0) is False
+
+    def test_waits_for_refill_within_max_wait(self, fake_clock):
+        limiter = vision_client.RateLimiter(2)
+        assert limiter.acquire(0) and limiter.acquire(0)
+        assert limiter.acquire(1.0) is True
+        assert fake_clock.sleeps == [0.5]
+
+    def test_gives_up_when_refill_exceeds_max_wait(self, fake_clock):
+        limiter = vision_client.RateLimiter(1)
+        assert limiter.acquire(0)
+        assert limiter.acquire(0.5) is False
+        assert fake_clock.sleeps == []
+
+
+class TestWithRetry:
+    def test_no_token_on_first_attempt_is_quota_error(self, vision_state, monkeypatch):
+        monkeypatch.setattr(vision_client, "_rate_limiter", SimpleNamespace(acquire=lambda wait: False))
+        with pytest.raises(vision_client.QuotaError):
+            vision_client._with_retry(lambda: "unused")
+
+    def test_no_token_for_retry_reports_the_outage(self, fake_clock, vision_state, monkeypatch):
+        tokens = iter([True])
+        monkeypatch.setattr(vision_client, "_rate_limiter", SimpleNamespace(acquire=lambda wait: next(tokens, False)))
+
+        def _unavailable():
+            raise gexc.ServiceUnavailable("down")
+        with pytest.raises(vision_client.ServiceUnavailableError):
+            vision_client._with_retry(_unavailable)
+
+    def test_no_in_flight_slot_is_quota_error(self, vision_state, monkeypatch):
+        slots = vision_client.threading.BoundedSemaphore(1)
+        slots.acquire()  # every slot busy
+        monkeypatch.setattr(vision_client, "_in_flight", slots)
+        monkeypatch.setattr(vision_client, "_IN_FLIGHT_WAIT", 0.01)
+        with pytest.raises(vision_client.QuotaError):
+            vision_client._with_retry(lambda: "unused")
+
+    def test_slot_is_released_after_an_error(self, vision_state, monkeypatch):
+        slots = vision_client.threading.BoundedSemaphore(1)
+        monkeypatch.setattr(vision_client, "_in_flight", slots)
+
+        def _denied():
+            raise gexc.PermissionDenied("no")
+        with pytest.raises(vision_client.AuthError):
+            vision_client._with_retry(_denied)
+        assert vision_client._with_retry(lambda: "ok") == "ok"
+
+
+class TestRetryBackoff:
+    @pytest.fixture(autouse=True)
+    def _no_jitter(self, monkeypatch):
+        monkeypatch.setattr(vision_client.random, "uniform", lambda a, b: 1.0)
+
+    def _unavailable(self, clock=None, cost=0.0):
+        calls = []
+
+        def _rpc():
+            calls.append(1)
+            if clock is not None:
+                clock.now += cost  # each attempt takes `cost` seconds
+            raise gexc.ServiceUnavailable("down")
+        return _rpc, calls
+
+    def test_delays_double_up_to_the_cap(self, fake_clock, vision_state, monkeypatch):
+        monkeypatch.setattr(vision_client, "_MAX_ATTEMPTS", 6)
+        monkeypatch.setattr(vision_client, "_BREAKER_THRESHOLD", 100)
+        rpc, calls = self._unavailable()
+        with pytest.raises(vision_client.ServiceUnavailableError):
+            vision_client._with_retry(rpc)
+        assert fake_clock.sleeps == [0.5, 1.0, 2.0, 4.0, 4.0]
+        assert len(calls) == 6
+
+    def test_stops_retrying_past_total_deadline(self, fake_clock, vision_state):
+        # Attempts take 6 s: t=6 sleep 0.5, t=12.5 sleep 1, t=19.5 → 2 s more would pass 15 s.
+        rpc, calls = self._unavailable(fake_clock, cost=6.0)
+        with pytest.raises(vision_client.ServiceUnavailableError):
+            vision_client._with_retry(rpc)
+        assert fake_clock.sleeps == [0.5, 1.0]
+        assert len(calls) == 3
+
+    def test_success_after_retry_returns_result(self, fake_clock, vision_state):
+        outcomes = iter([gexc.ServiceUnavailable("down"), "ok"])
+
+        def _rpc():
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        assert vision_client._with_retry(_rpc) == "ok"
+        assert fake_clock.sleeps == [0.5]
+
+
+class TestCallVisionApiBatch:
+    def test_more_than_sixteen_images_are_split_and_reassembled_in_order(self, vision_state, monkeypatch):
+        sizes = []
+
+        def _annotate(requests):
+            sizes.append(len(requests))
+            return list(requests)  # echo requests back as their responses
+        monkeypatch.setattr(vision_client, "_annotate", _annotate)
+        images = [str(i).encode() for i in range(35)]
+        responses = vision_client.call_vision_api_batch(images)
+        assert sizes == [16, 16, 3]
+        assert [r.image.content for r in responses] == images
+
+
+class TestCircuitBreaker:
+    def _outages(self, n: int) -> None:
+        for _ in range(n):
+            vision_client._record_outage()
+
+    def test_stays_closed_below_threshold(self, fake_clock, vision_state):
+        self._outages(vision_client._BREAKER_THRESHOLD - 1)
+        vision_client._check_breaker()  # does not raise
+
+    def test_opens_at_threshold(self, fake_clock, vision_state):
+        self._outages(vision_client._BREAKER_THRESHOLD)
+        with pytest.raises(vision_client.ServiceUnavailableError):
+            vision_client._check_breaker()
+
+    def test_success_resets_the_count(self, fake_clock, vision_state):
+        self._outages(vision_client._BREAKER_THRESHOLD - 1)
+        vision_client._record_success()
+        self._outages(vision_client._BREAKER_THRESHOLD - 1)
+        vision_client._check_breaker()
+
+    def test_half_open_after_cooldown(self, fake_clock, vision_state):
+        self._outages(vision_client._BREAKER_THRESHOLD)
+        fake_clock.now += vision_client._BREAKER_COOLDOWN
+        vision_client._check_breaker()  # the probe call goes through
+
+    def test_outage_while_half_open_reopens_immediately(self, fake_clock, vision_state):
+        self._outages(vision_client._BREAKER_THRESHOLD)
+        fake_clock.now += vision_client._BREAKER_COOLDOWN
+        self._outages(1)
+        with pytest.raises(vision_client.ServiceUnavailableError):
+            vision_client._check_breaker()
+
+    def test_success_while_half_open_closes(self, fake_clock, vision_state):
+        self._outages(vision_client._BREAKER_THRESHOLD)
+        fake_clock.now += vision_client._BREAKER_COOLDOWN
+        vision_client._record_success()
+        self._outages(vision_client._BREAKER_THRESHOLD - 1)
+        vision_client._check_breaker()
+
+    def test_open_breaker_fails_fast_without_calling_vision(self, fake_clock, vision_state):
+        self._outages(vision_client._BREAKER_THRESHOLD)
+        calls = []
+        with pytest.raises(vision_client.ServiceUnavailableError):
+            vision_client._with_retry(lambda: calls.append(1))
+        assert calls == []
+
+
+class _FakeVisionClient:
+    """Echoes each request back as its 'response' (unless `respond` is given); raises if told to."""
+
+    def __init__(self, fail=None, respond=list):
+        self.calls: list[list] = []
+        self._fail = fail        # callable(requests) -> exception or None
+        self._respond = respond  # callable(requests) -> responses
+
+    def batch_annotate_images(self, requests, timeout):
+        self.calls.append(list(requests))
+        exc = self._fail(requests) if self._fail else None
+        if exc is not None:
+            raise exc
+        return SimpleNamespace(responses=self._respond(requests))
+
+
+def _submission(*images: bytes):
+    from concurrent.futures import Future
+    return vision_client._build_requests(list(images), [None] * len(images)), Future()
+
+
+class TestBatcher:
+    def _use_client(self, monkeypatch, fake):
+        monkeypatch.setattr(vision_client, "_get_client", lambda: fake)
+        return fake
+
+    def test_dispatch_merges_then_slices_responses_per_caller(self, monkeypatch):
+        fake = self._use_client(monkeypatch, _FakeVisionClient())
+        a, b = _submission(b"a1", b"a2"), _submission(b"b1")
+        vision_client._Batcher._dispatch([a, b])
+        assert len(fake.calls) == 1 and len(fake.calls[0]) == 3
+        assert [r.image.content for r in a[1].result()] == [b"a1", b"a2"]
+        assert [r.image.content for r in b[1].result()] == [b"b1"]
+
+    def test_rpc_error_is_raised_in_every_caller(self, monkeypatch):
+        self._use_client(monkeypatch, _FakeVisionClient(fail=lambda reqs: gexc.ServiceUnavailable("down")))
+        a, b = _submission(b"a"), _submission(b"b")
+        vision_client._Batcher._dispatch([a, b])
+        for _, future in (a, b):
+            with pytest.raises(gexc.ServiceUnavailable):
+                future.result()
+
+    def test_invalid_argument_resends_each_caller_alone(self, monkeypatch):
+        def _fail(reqs):
+            if any(r.image.content == b"bad" for r in reqs):
+                return gexc.InvalidArgument("bad image")
+        fake = self._use_client(monkeypatch, _FakeVisionClient(fail=_fail))
+        good, bad = _submission(b"good"), _submission(b"bad")
+        vision_client._Batcher._dispatch([good, bad])
+        assert [len(call) for call in fake.calls] == [2, 1, 1]
+        assert [r.image.content for r in good[1].result()] == [b"good"]
+        with pytest.raises(gexc.InvalidArgument):
+            bad[1].result()
+
+    def test_submission_over_image_limit_is_carried_to_next_batch(self):
+        batcher = vision_client._Batcher()  # collector not started
+        first, second = _submission(*[b"x"] * 10), _submission(*[b"y"] * 10)
+        batcher._queue.put(first)
+        batcher._queue.put(second)
+        assert batcher._next_batch() == [first]
+        assert batcher._next_batch() == [second]
+
+    def test_submission_over_byte_limit_is_carried_to_next_batch(self, monkeypatch):
+        monkeypatch.setattr(vision_client, "_BATCH_MAX_BYTES", 10)
+        batcher = vision_client._Batcher()
+        first, second = _submission(b"123456"), _submission(b"789012")
+        batcher._queue.put(first)
+        batcher._queue.put(second)
+        assert batcher._next_batch() == [first]
+        assert batcher._next_batch() == [second]
+
+    def test_small_submissions_share_a_batch(self):
+        batcher = vision_client._Batcher()
+        first, second = _submission(b"a"), _submission(b"b")
+        batcher._queue.put(first)
+        batcher._queue.put(second)
+        assert batcher._next_batch() == [first, second]
+
+    def test_failed_merged_batch_counts_as_one_outage(self, fake_clock, vision_state, monkeypatch):
+        import threading
+        from google.cloud import vision
+        failures = iter([gexc.ServiceUnavailable("blip")])  # only the first RPC fails
+        fake = self._use_client(monkeypatch, _FakeVisionClient(
+            fail=lambda reqs: next(failures, None),
+            respond=lambda reqs: [vision.AnnotateImageResponse() for _ in reqs],
+        ))
+        monkeypatch.setattr(vision_client.random, "uniform", lambda a, b: 0.0)
+        monkeypatch.setattr(vision_client, "_COALESCE", True)
+        monkeypatch.setattr(vision_client, "_COALESCE_WINDOW", 0.5)
+        monkeypatch.setattr(vision_client, "_batcher", None)
+
+        callers = vision_client._BREAKER_THRESHOLD + 1
+        barrier = threading.Barrier(callers)
+        errors = []
+
+        def _call():
+            barrier.wait()
+            try:
+                vision_client.call_vision_api(b"img")
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=_call) for _ in range(callers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=10)
+
+        assert len(fake.calls[0]) == callers  # every caller shared the failed RPC
+        assert errors == []
+        vision_client._check_breaker()  # one blip, one outage: still closed
+
+    def test_caller_times_out_if_batch_never_runs(self, monkeypatch):
+        monkeypatch.setattr(vision_client, "_BATCH_WAIT", 0.01)
+        batcher = vision_client._Batcher()  # nothing collects the submission
+        with pytest.raises(gexc.DeadlineExceeded):
+            batcher.submit(_submission(b"a")[0])
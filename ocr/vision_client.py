@@ -1,18 +1,65 @@
 """
 Google Cloud Vision API client — network boundary.
 
-All code that makes real HTTP calls to Google lives here.
-This module is intentionally excluded from unit-test coverage
-because its only logic is gluing our code to a third-party API.
+All code that makes real calls to Google lives here, together with the
+process-wide controls around them: the local rate limiter, the in-flight
+cap, the circuit breaker, retry with a time budget, and optional request
+coalescing. Tests exercise that logic against fake clients and clocks; only
+the RPC itself is never run under test.
 """
+import os
+import queue
+import random
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 
 from google.cloud import vision
 from google.api_core import exceptions as gexc
 
 _VISION_TIMEOUT = 30        # seconds per API call
 _MAX_ATTEMPTS   = 4         # 1 initial + 3 retries
-_RETRY_DELAYS   = [1, 2, 4] # seconds between attempts
+_BACKOFF_BASE   = 0.5       # seconds; retry n sleeps min(cap, base * 2**(n-1)) ± 50 %
+_BACKOFF_CAP    = 4.0
+_TOTAL_DEADLINE = 15.0      # give up retrying once this much wall time is spent
+
+# Cap on concurrent outbound Vision calls per process. It defaults to half the
+# gunicorn threads per worker so it binds before gthread does, leaving threads
+# free for /health and the ZKP proxy during a burst. A call that cannot get a
+# slot within _IN_FLIGHT_WAIT fails rather than holding its thread.
+_MAX_IN_FLIGHT  = int(
+    os.getenv("VISION_MAX_CONCURRENCY")
+    or max(1, int(os.getenv("GUNICORN_THREADS", "16")) // 2)
+)
+_IN_FLIGHT_WAIT = 5.0       # seconds a call may wait for an in-flight slot
+
+# Local token bucket in front of Vision, kept below the GCP quota so bursts
+# queue briefly here instead of coming back as ResourceExhausted. The bucket
+# is per process: with N gunicorn workers the service-wide rate is N × this.
+_VISION_RPS      = float(os.getenv("VISION_RPS", "20"))
+_RATE_LIMIT_WAIT = 0.5      # seconds a call may wait for a token
+
+# Opt-in request coalescing: calls arriving within a short window share one
+# batch_annotate_images RPC. Off by default — under light load the window is
+# pure added latency.
+_COALESCE        = os.getenv("VISION_COALESCE", "false").lower() == "true"
+_COALESCE_WINDOW = 0.02     # seconds to wait for more requests to join a batch
+_BATCH_LIMIT     = 16       # Vision's maximum images per batch request
+_BATCH_MAX_BYTES = 8 * 1024 * 1024  # stop merging well below Vision's request-size limit
+_BATCH_WAIT      = _VISION_TIMEOUT + 5  # seconds a caller waits for its coalesced batch
+
+_BREAKER_THRESHOLD = 5      # consecutive ServiceUnavailable responses…
+_BREAKER_COOLDOWN  = 30     # …before failing fast for this many seconds
+
+# Google API exceptions mapped by _with_retry, bound once at import.
+_AUTH_EXC      = (gexc.PermissionDenied, gexc.Unauthenticated)
+_QUOTA_EXC     = gexc.ResourceExhausted
+_BAD_EXC       = gexc.InvalidArgument
+_TIMEOUT_EXC   = gexc.DeadlineExceeded
+_TRANSIENT_EXC = gexc.ServiceUnavailable
+
+# Every request asks for the same feature, so build the proto once.
+_FEATURE = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
 
 
 # ---------------------------------------------------------------------------
@@ -48,55 +95,171 @@ class ServiceUnavailableError(GoogleOCRError):
 # Vision API call with retry
 # ---------------------------------------------------------------------------
 
+# One client per process: the gRPC channel is thread-safe and multiplexes
+# concurrent calls, so rebuilding it (TLS, auth plugin) per request is waste.
+# Created lazily so importing this module needs no credentials.
+_client: vision.ImageAnnotatorClient | None = None
+_client_lock = threading.Lock()
+
+
 def _get_client() -> vision.ImageAnnotatorClient:
-    return vision.ImageAnnotatorClient()
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = vision.ImageAnnotatorClient()
+    return _client
 
 
-def call_vision_api(
-    image_bytes: bytes,
-    image_context: vision.ImageContext | None = None,
-) -> vision.AnnotateImageResponse:
+def reset_vision_client() -> None:
+    """Drop the cached client so the next call builds a fresh one. Test-only."""
+    global _client
+    with _client_lock:
+        _client = None
+
+
+class RateLimiter:
     """
-    Call Google Vision DOCUMENT_TEXT_DETECTION with timeout and exponential
-    backoff retry for transient errors.
+    Thread-safe token bucket: refills `rate` tokens/s and holds at most
+    max(rate, 1), so rates below 1/s still reach a whole token.
+    """
+
+    def __init__(self, rate: float):
+        if rate <= 0:
+            raise ValueError(f"Rate limit must be positive, got {rate:g} requests/s.")
+        self._rate     = rate
+        self._capacity = max(rate, 1.0)
+        self._tokens   = self._capacity
+        self._updated  = time.monotonic()
+        self._lock     = threading.Lock()
+
+    def acquire(self, max_wait: float) -> bool:
+        """Take one token, waiting up to max_wait seconds. Returns False on timeout."""
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens  = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self._rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+_rate_limiter = RateLimiter(_VISION_RPS)
+_in_flight    = threading.BoundedSemaphore(_MAX_IN_FLIGHT)
+
+# Process-wide circuit breaker: during a Vision outage, stop sending requests
+# (and retries) for a cool-down window instead of amplifying the outage.
+#   closed    — _breaker_open_until == 0; count consecutive outages
+#   open      — now < _breaker_open_until; fail fast
+#   half-open — cool-down over; the next outage reopens at once, a success closes
+_breaker_lock = threading.Lock()
+_consecutive_outages = 0
+_breaker_open_until  = 0.0
+
+
+def _check_breaker() -> None:
+    if time.monotonic() < _breaker_open_until:
+        raise ServiceUnavailableError(
+            "Google Vision is temporarily unavailable (recent repeated failures); "
+            "try again shortly."
+        )
+
+
+def _record_outage() -> None:
+    global _consecutive_outages, _breaker_open_until
+    with _breaker_lock:
+        _consecutive_outages += 1
+        if _consecutive_outages >= _BREAKER_THRESHOLD or _breaker_open_until:
+            _breaker_open_until = time.monotonic() + _BREAKER_COOLDOWN
+            _consecutive_outages = 0
+
+
+def _record_success() -> None:
+    global _consecutive_outages, _breaker_open_until
+    if _consecutive_outages or _breaker_open_until:  # skip the lock on the usual path
+        with _breaker_lock:
+            _consecutive_outages = 0
+            _breaker_open_until  = 0.0
+
+
+def _with_retry(rpc):
+    """
+    Run a Vision RPC, retrying ServiceUnavailable with jittered exponential
+    backoff, and map Google API exceptions to our own error types.
+
+    Retries stop early once the next sleep would push the call past
+    _TOTAL_DEADLINE, so a sustained outage frees the worker sooner.
+
+    DeadlineExceeded is not retried: our timeout is already long (30 s), so a
+    second attempt would almost certainly time out too.
 
     Raises:
         AuthError               — bad credentials (403)
-        QuotaError              — quota exceeded (429)
+        QuotaError              — quota exceeded, or local rate or
+                                  concurrency limit hit on the first
+                                  attempt (429)
         BadImageError           — image rejected by Vision (422)
-        ServiceUnavailableError — still unavailable after all retries (503)
+        ServiceUnavailableError — still unavailable after all retries (or no
+                                  token for a retry), timed out, or circuit
+                                  breaker open (503)
         GoogleOCRError          — any other Google API error (500)
     """
-    client = _get_client()
-    image  = vision.Image(content=image_bytes)
     last_exc: GoogleOCRError | None = None
+    start = time.monotonic()
 
     for attempt in range(_MAX_ATTEMPTS):
         if attempt > 0:
-            time.sleep(_RETRY_DELAYS[attempt - 1])
+            delay = min(_BACKOFF_CAP, _BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+            if time.monotonic() - start + delay > _TOTAL_DEADLINE:
+                break
+            time.sleep(delay)
+        _check_breaker()
+        if not _rate_limiter.acquire(_RATE_LIMIT_WAIT):
+            if last_exc is not None:
+                raise last_exc  # mid-retry: report the outage, not a local 429
+            raise QuotaError(
+                f"Too many OCR requests (local limit {_VISION_RPS:g}/s). "
+                f"Try again shortly."
+            )
 
-        try:
-            response = client.document_text_detection(
-                image=image,
-                image_context=image_context,
-                timeout=_VISION_TIMEOUT,
+        # Backoff sleeps happen above, so they hold no slot.
+        if not _in_flight.acquire(timeout=_IN_FLIGHT_WAIT):
+            if last_exc is not None:
+                raise last_exc
+            raise QuotaError(
+                f"Too many concurrent OCR requests (local limit {_MAX_IN_FLIGHT}). "
+                f"Try again shortly."
             )
-        except (gexc.PermissionDenied, gexc.Unauthenticated) as e:
+        try:
+            result = rpc()
+        except _AUTH_EXC as e:
             raise AuthError(
                 f"Google Vision authentication failed. "
                 f"Check your service account credentials. ({e.message})"
             ) from e
-        except gexc.ResourceExhausted as e:
+        except _QUOTA_EXC as e:
             raise QuotaError(
                 f"Google Vision API quota exceeded. "
                 f"Check your GCP quota limits. ({e.message})"
             ) from e
-        except gexc.InvalidArgument as e:
+        except _BAD_EXC as e:
             raise BadImageError(
                 f"Image could not be processed by Google Vision. "
                 f"Ensure it is a valid JPEG/PNG and at least 64×64 px. ({e.message})"
             ) from e
-        except (gexc.ServiceUnavailable, gexc.DeadlineExceeded) as e:
+        except _TIMEOUT_EXC as e:
+            raise ServiceUnavailableError(
+                f"Google Vision did not respond within {_VISION_TIMEOUT} s. ({e.message})"
+            ) from e
+        except _TRANSIENT_EXC as e:
+            # The outage was already counted by _send_batch, once per RPC —
+            # coalesced callers share one failure and must not each count it.
             last_exc = ServiceUnavailableError(
                 f"Google Vision is temporarily unavailable "
                 f"(attempt {attempt + 1}/{_MAX_ATTEMPTS}). ({e.message})"
@@ -104,13 +267,181 @@ def call_vision_api(
             continue  # retry
         except gexc.GoogleAPIError as e:
             raise GoogleOCRError(f"Google Vision API error: {e.message}") from e
+        finally:
+            _in_flight.release()
 
-        # Handle application-level errors returned inside the response
-        if response.error.message:
-            raise GoogleOCRError(
-                f"Google Vision returned an error: {response.error.message}"
-            )
+        _record_success()
+        return result
+
+    raise last_exc  # exhausted retries (or retry budget) for transient error
 
-        return response
 
-    raise last_exc  # exhausted retries for transient error
+def raise_for_response_error(response: vision.AnnotateImageResponse) -> None:
+    """Raise GoogleOCRError for an application-level error inside a response."""
+    if response.error.code:  # google.rpc.Status: 0 is OK
+        raise GoogleOCRError(
+            f"Google Vision returned an error: {response.error.message}"
+        )
+
+
+def _send_batch(requests: list) -> list[vision.AnnotateImageResponse]:
+    """The single batch_annotate_images call site; feeds the circuit breaker."""
+    try:
+        batch = _get_client().batch_annotate_images(requests=requests, timeout=_VISION_TIMEOUT)
+    except _TRANSIENT_EXC:
+        _record_outage()
+        raise
+    return list(batch.responses)
+
+
+def _payload_size(requests: list) -> int:
+    return sum(len(req.image.content) for req in requests)
+
+
+class _Batcher:
+    """
+    Packs AnnotateImageRequests from concurrent callers into shared
+    batch_annotate_images RPCs.
+
+    A background thread collects submissions for up to _COALESCE_WINDOW (or
+    until _BATCH_LIMIT images or _BATCH_MAX_BYTES of image data are queued),
+    sends them as one RPC on a worker pool, and hands each caller back its own
+    slice of the responses. RPC-level exceptions are re-raised in every
+    caller, so _with_retry handles them as usual — except InvalidArgument on a
+    merged batch, which may be one caller's bad image, so each caller's
+    requests are then re-sent on their own.
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._carry = None  # submission that did not fit in the previous batch
+        self._pool  = ThreadPoolExecutor(max_workers=_MAX_IN_FLIGHT, thread_name_prefix="vision-batch")
+        self._thread = threading.Thread(target=self._collect, name="vision-batcher", daemon=True)
+
+    def start(self) -> "_Batcher":
+        self._thread.start()
+        return self
+
+    def submit(self, requests: list) -> list[vision.AnnotateImageResponse]:
+        future: Future = Future()
+        self._queue.put((requests, future))
+        try:
+            return future.result(timeout=_BATCH_WAIT)
+        except FutureTimeout:
+            raise gexc.DeadlineExceeded("Timed out waiting for a coalesced Vision batch.")
+
+    def _collect(self) -> None:
+        while True:
+            self._pool.submit(self._dispatch, self._next_batch())
+
+    def _next_batch(self) -> list:
+        """Block for one submission, then gather more until the window or a limit is hit."""
+        first = self._carry or self._queue.get()
+        self._carry = None
+        items = [first]
+        count, size = len(first[0]), _payload_size(first[0])
+        deadline = time.monotonic() + _COALESCE_WINDOW
+        while count < _BATCH_LIMIT and size < _BATCH_MAX_BYTES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            item_size = _payload_size(item[0])
+            if count + len(item[0]) > _BATCH_LIMIT or size + item_size > _BATCH_MAX_BYTES:
+                self._carry = item
+                break
+            items.append(item)
+            count += len(item[0])
+            size  += item_size
+        return items
+
+    @staticmethod
+    def _dispatch(items: list) -> None:
+        requests = [req for reqs, _ in items for req in reqs]
+        try:
+            responses = _send_batch(requests)
+        except Exception as e:
+            if isinstance(e, _BAD_EXC) and len(items) > 1:
+                for item in items:  # isolate the offending caller
+                    _Batcher._dispatch([item])
+                return
+            for _, future in items:
+                future.set_exception(e)
+            return
+        offset = 0
+        for reqs, future in items:
+            future.set_result(responses[offset: offset + len(reqs)])
+            offset += len(reqs)
+
+
+_batcher: _Batcher | None = None
+_batcher_lock = threading.Lock()
+
+
+def _annotate(requests: list) -> list[vision.AnnotateImageResponse]:
+    """One batch_annotate_images RPC, coalesced with other callers if enabled."""
+    global _batcher
+    if _COALESCE:
+        if _batcher is None:
+            with _batcher_lock:
+                if _batcher is None:
+                    _batcher = _Batcher().start()  # started lazily, after any fork
+        return _batcher.submit(requests)
+    return _send_batch(requests)
+
+
+def _build_requests(
+    images: list[bytes],
+    image_contexts: list[vision.ImageContext | None],
+) -> list[vision.AnnotateImageRequest]:
+    return [
+        vision.AnnotateImageRequest(
+            image=vision.Image(content=image_bytes),
+            features=[_FEATURE],
+            image_context=ctx,
+        )
+        for image_bytes, ctx in zip(images, image_contexts)
+    ]
+
+
+def call_vision_api(
+    image_bytes: bytes,
+    image_context: vision.ImageContext | None = None,
+) -> vision.AnnotateImageResponse:
+    """
+    Call Google Vision DOCUMENT_TEXT_DETECTION with timeout and exponential
+    backoff retry for transient errors.
+
+    Raises:  see _with_retry; GoogleOCRError if the response carries an error.
+    """
+    requests = _build_requests([image_bytes], [image_context])
+    response = _with_retry(lambda: _annotate(requests))[0]
+    raise_for_response_error(response)
+    return response
+
+
+def call_vision_api_batch(
+    images: list[bytes],
+    image_contexts: list[vision.ImageContext | None] | None = None,
+) -> list[vision.AnnotateImageResponse]:
+    """
+    Run DOCUMENT_TEXT_DETECTION on several images with as few
+    batch_annotate_images RPCs as possible. Vision accepts at most 16 images
+    per request, so longer lists are sent in chunks of _BATCH_LIMIT, each
+    retried on its own.
+
+    Returns one response per image, in order. Per-image errors are not raised
+    here — a failure on one image should not discard the others — so callers
+    check each response with raise_for_response_error.
+
+    Raises:  see _with_retry (RPC-level failures only).
+    """
+    requests = _build_requests(images, image_contexts or [None] * len(images))
+    responses: list[vision.AnnotateImageResponse] = []
+    for start in range(0, len(requests), _BATCH_LIMIT):
+        chunk = requests[start: start + _BATCH_LIMIT]
+        responses.extend(_with_retry(lambda: _annotate(chunk)))
+    return responses